@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CAPACITY = int(os.environ.get("ADMISSION_CAPACITY", "32"))
+ADMIN_CAPACITY = int(os.environ.get("ADMISSION_ADMIN_CAPACITY", "4"))
+MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "128"))
+ADMIN_MAX_QUEUE = int(os.environ.get("ADMISSION_ADMIN_MAX_QUEUE", "16"))
+QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+CONFIRM_RATE = float(os.environ.get("CONFIRM_RATE", "0.5"))
+CONFIRM_BURST = float(os.environ.get("CONFIRM_BURST", "5"))
+CONFIRM_CLIENTS = 10_000
+
+GUEST_PATHS = ("/view/", "/confirm")
+GUEST, ADMIN = 0, 1
+CLASSES = {GUEST: "guest", ADMIN: "admin"}
+
+
+class Limiter:
+    def __init__(self, capacity: int, admin_capacity: int, max_queue: dict[int, int]):
+        self.capacity = capacity
+        self.admin_capacity = admin_capacity
+        # Bounded per class so queued admin work can never shed a guest.
+        self.max_queue = max_queue
+        self.active = {GUEST: 0, ADMIN: 0}
+        self.queued = {GUEST: 0, ADMIN: 0}
+        self.waiting: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._seq = itertools.count()
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self.active.values()) >= self.capacity:
+            return False
+        return priority != ADMIN or self.active[ADMIN] < self.admin_capacity
+
+    def _wake(self):
+        while self.waiting:
+            priority, _, fut = self.waiting[0]
+            if fut.done():
+                heapq.heappop(self.waiting)
+                continue
+            if not self._can_run(priority):
+                break
+            heapq.heappop(self.waiting)
+            self.queued[priority] -= 1
+            self.active[priority] += 1
+            fut.set_result(None)
+
+    def _drop(self, entry: tuple[int, int, asyncio.Future[None]]):
+        entry[2].cancel()
+        if entry in self.waiting:
+            self.waiting.remove(entry)
+            heapq.heapify(self.waiting)
+            self.queued[entry[0]] -= 1
+
+    async def acquire(self, priority: int) -> bool:
+        ahead = self.waiting and self.waiting[0][0] <= priority
+        if self._can_run(priority) and not ahead:
+            self.active[priority] += 1
+            return True
+        if self.queued[priority] >= self.max_queue[priority]:
+            return False
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), fut)
+        heapq.heappush(self.waiting, entry)
+        self.queued[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=QUEUE_TIMEOUT)
+        except TimeoutError:
+            # The slot may have been granted just as the timeout fired.
+            if fut.done():
+                return True
+            self._drop(entry)
+            return False
+        except asyncio.CancelledError:
+            if fut.done():
+                self.release(priority)
+            else:
+                self._drop(entry)
+            raise
+        return True
+
+    def release(self, priority: int):
+        self.active[priority] -= 1
+        self._wake()
+
+
+limiter = Limiter(CAPACITY, ADMIN_CAPACITY, {GUEST: MAX_QUEUE, ADMIN: ADMIN_MAX_QUEUE})
+queue_times: defaultdict[int, deque[float]] = defaultdict(lambda: deque(maxlen=1000))
+counters: defaultdict[str, int] = defaultdict(int)
+_buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+
+# Proxy headers are left to uvicorn's --proxy-headers, which rewrites the
+# scope client only for trusted forwarders.
+def _client(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+def _allow(client: str) -> bool:
+    now = time.monotonic()
+    tokens, last = _buckets.pop(client, (CONFIRM_BURST, now))
+    tokens = min(CONFIRM_BURST, tokens + (now - last) * CONFIRM_RATE)
+    allowed = tokens >= 1
+    _buckets[client] = (tokens - 1 if allowed else tokens, now)
+    if len(_buckets) > CONFIRM_CLIENTS:
+        _buckets.popitem(last=False)
+    return allowed
+
+
+def _percentile(samples: deque[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+
+def metrics() -> dict:
+    return {
+        "active": {CLASSES[p]: n for p, n in limiter.active.items()},
+        "waiting": {CLASSES[p]: n for p, n in limiter.queued.items()},
+        "counters": dict(counters),
+        "queue_ms": {
+            CLASSES[p]: {
+                "p50": round(_percentile(samples, 0.5) * 1000, 2),
+                "p99": round(_percentile(samples, 0.99) * 1000, 2),
+            }
+            for p, samples in queue_times.items()
+        },
+    }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        if path == "/confirm" and not _allow(_client(scope)):
+            counters["rate_limited"] += 1
+            return await self._reject(429, scope, receive, send)
+
+        priority = GUEST if path.startswith(GUEST_PATHS) else ADMIN
+        start = time.monotonic()
+        if not await limiter.acquire(priority):
+            counters[f"{CLASSES[priority]}_shed"] += 1
+            return await self._reject(503, scope, receive, send)
+
+        waited = time.monotonic() - start
+        queue_times[priority].append(waited)
+        counters[f"{CLASSES[priority]}_admitted"] += 1
+
+        # Event streams are long-lived and do their work in the shared feed
+        # poller, so they give their slot back once headers go out. Exports
+        # keep theirs until the body is done.
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(priority)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                if headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    release()
+                timing = f"queue;dur={waited * 1000:.1f}".encode()
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", timing),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
+
+    async def _reject(self, status: int, scope: Scope, receive: Receive, send: Send):
+        response = PlainTextResponse(
+            "Busy, please try again shortly.",
+            status_code=status,
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,216 @@
+import csv
+import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import IO
+
+from cordially_sdk.ontology.objects import Recipient
+
+import palantir as pltr
+
+# Foundry applies at most this many actions per batch call unless raised.
+BATCH_ACTION_LIMIT = int(os.environ.get("FOUNDRY_BATCH_ACTION_LIMIT", "20"))
+IMPORT_BATCH_SIZE = min(
+    int(os.environ.get("IMPORT_BATCH_SIZE", str(BATCH_ACTION_LIMIT))),
+    BATCH_ACTION_LIMIT,
+)
+IMPORT_MAX_FAILED_BATCHES = 3
+IMPORT_JOB_TTL = 3600.0
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "500"))
+EXPORT_FIELDS = ["honorific", "name", "link", "confirmed"]
+
+
+@dataclass
+class ImportJob:
+    id: str
+    read: int = 0
+    created: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    failed: int = 0
+    done: bool = False
+    finished: float = 0.0
+    error: str = ""
+
+
+import_jobs: dict[str, ImportJob] = {}
+
+
+def _key(hnr: str | None, name: str | None) -> tuple[str, str]:
+    return (hnr or "").strip().casefold(), (name or "").strip().casefold()
+
+
+def _rows(stream: IO[bytes], filename: str) -> Iterator[list[str]]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    delimiter = "\t" if filename.lower().endswith((".tsv", ".tab")) else ","
+    return csv.reader(text, delimiter=delimiter)
+
+
+def _records(rows: Iterator[list[str]]) -> Iterator[tuple[str, str] | None]:
+    header = next(rows, None)
+    if header is None:
+        return
+
+    cols = [c.strip().casefold() for c in header]
+    if "name" not in cols:
+        raise ValueError("First row must be a header with a 'name' column")
+    name_col = cols.index("name")
+    hnr_col = cols.index("honorific") if "honorific" in cols else None
+
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        if name_col >= len(row) or not row[name_col].strip():
+            yield None
+            continue
+        hnr = row[hnr_col].strip() if hnr_col is not None and hnr_col < len(row) else ""
+        yield hnr, row[name_col].strip()
+
+
+def _flush(job: ImportJob, batch: list[tuple[str, str]]) -> bool:
+    try:
+        pltr.create_recipients(batch)
+    except Exception as e:
+        job.failed += len(batch)
+        job.error = str(e) or type(e).__name__
+        return False
+    job.created += len(batch)
+    return True
+
+
+def _run_import(job: ImportJob, stream: IO[bytes], filename: str):
+    try:
+        seen = {_key(r.honorific, r.name) for r in pltr.recipients()}
+        batch: list[tuple[str, str]] = []
+        failed_batches = 0
+        for record in _records(_rows(stream, filename)):
+            job.read += 1
+            if record is None:
+                job.invalid += 1
+                continue
+            key = _key(*record)
+            if key in seen:
+                job.skipped += 1
+                continue
+
+            seen.add(key)
+            batch.append(record)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                failed_batches = 0 if _flush(job, batch) else failed_batches + 1
+                batch = []
+                if failed_batches >= IMPORT_MAX_FAILED_BATCHES:
+                    job.error = f"Aborted after repeated failures: {job.error}"
+                    return
+
+        if batch:
+            _flush(job, batch)
+    except Exception as e:
+        job.error = str(e) or type(e).__name__
+    finally:
+        stream.close()
+        job.finished = time.monotonic()
+        job.done = True
+
+
+def start_import(upload: IO[bytes], filename: str) -> ImportJob:
+    # Spool to disk so the worker outlives the request's upload file.
+    stream = tempfile.TemporaryFile()
+    shutil.copyfileobj(upload, stream)
+    stream.seek(0)
+
+    now = time.monotonic()
+    for id, old in list(import_jobs.items()):
+        if old.done and now - old.finished > IMPORT_JOB_TTL:
+            del import_jobs[id]
+
+    job = ImportJob(id=uuid.uuid4().hex)
+    import_jobs[job.id] = job
+    threading.Thread(
+        target=_run_import, args=(job, stream, filename), daemon=True
+    ).start()
+    return job
+
+
+@dataclass
+class Export:
+    event: str | None
+    names: dict[str, str]
+    people: dict[str, Recipient]
+
+
+def prepare_export(event: str | None = None) -> Export:
+    names = {e.id: e.name or "" for e in pltr.events()} if event is None else {}
+    return Export(event, names, pltr.recipient_index())
+
+
+def _export_rows(export: Export) -> Iterator[dict]:
+    for rsvp in pltr.iter_rsvps(export.event):
+        person = export.people.get(rsvp.recipient_id or "")
+        row = {
+            "honorific": (person.honorific if person else "") or "",
+            "name": (person.name if person else "") or "",
+            "link": f"/view/{rsvp.primary_key_}",
+            "confirmed": bool(rsvp.confirmed),
+        }
+        if export.event is None:
+            row = {"event": export.names.get(rsvp.event_id or "", ""), **row}
+        yield row
+
+
+def _chunked(parts: Iterator[str]) -> Iterator[str]:
+    while chunk := "".join(itertools.islice(parts, EXPORT_CHUNK_ROWS)):
+        yield chunk
+
+
+def _csv_lines(export: Export) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(
+        buf, fieldnames=EXPORT_FIELDS if export.event else ["event", *EXPORT_FIELDS]
+    )
+    writer.writeheader()
+    yield buf.getvalue()
+
+    for row in _export_rows(export):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(row)
+        yield buf.getvalue()
+
+
+def _json_items(export: Export) -> Iterator[str]:
+    yield "["
+    sep = ""
+    for row in _export_rows(export):
+        yield sep + json.dumps(row)
+        sep = ","
+    yield "]"
+
+
+# Headers are already sent when a page fetch fails, so the body says the file
+# is incomplete and the re-raise aborts the transfer.
+def export_csv(export: Export) -> Iterator[str]:
+    lines = _csv_lines(export)
+    try:
+        yield next(lines)
+        yield from _chunked(lines)
+    except Exception as e:
+        yield f"# ERROR: export incomplete ({type(e).__name__})\r\n"
+        raise
+
+
+def export_json(export: Export) -> Iterator[str]:
+    items = _json_items(export)
+    try:
+        yield next(items)
+        yield from _chunked(items)
+    except Exception as e:
+        yield json.dumps({"error": f"export incomplete ({type(e).__name__})"})
+        raise
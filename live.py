@@ -0,0 +1,132 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+
+from cordially_sdk.ontology.objects import Recipient
+
+import palantir as pltr
+
+LIVE_POLL_INTERVAL = float(os.environ.get("LIVE_POLL_INTERVAL", "5.0"))
+LIVE_PEOPLE_TTL = float(os.environ.get("LIVE_PEOPLE_TTL", "60.0"))
+
+# (kind, rsvp, label) where kind is "reset", "add" or "remove"
+type Change = tuple[str, str, str]
+
+
+@dataclass
+class Feed:
+    event: str
+    loop: asyncio.AbstractEventLoop
+    subscribers: set[asyncio.Queue[list[Change]]] = field(default_factory=set)
+    confirmed: dict[str, str] | None = None
+    rsvps: dict[str, str] = field(default_factory=dict)
+    # In-process /confirm writes, kept until a poll that started later sees them.
+    pushed: dict[str, tuple[bool, float]] = field(default_factory=dict)
+    task: asyncio.Task | None = None
+
+
+feeds: dict[str, Feed] = {}
+_people: dict[str, Recipient] = {}
+_people_at = 0.0
+
+
+def _label(rcp: str | None) -> str:
+    person = _people.get(rcp or "")
+    return f"{person.honorific if person else ''} {person.name if person else ''}"
+
+
+def _poll(feed: Feed) -> dict[str, str]:
+    global _people, _people_at
+    # Uncached: a stale list would undo confirmations pushed in-process.
+    rsvps = [r for r in pltr.rsvps_for(feed.event, stale=False) if r.primary_key_]
+    unknown = any(r.confirmed and r.recipient_id not in _people for r in rsvps)
+    if unknown or time.monotonic() - _people_at > LIVE_PEOPLE_TTL:
+        _people = pltr.recipient_index()
+        _people_at = time.monotonic()
+
+    feed.rsvps = {r.primary_key_: r.recipient_id or "" for r in rsvps}
+    return {r.primary_key_: _label(r.recipient_id) for r in rsvps if r.confirmed}
+
+
+def _apply(feed: Feed, confirmed: dict[str, str]):
+    old = feed.confirmed or {}
+    relabeled = [id for id in old.keys() & confirmed.keys() if old[id] != confirmed[id]]
+    changes: list[Change] = [
+        ("remove", id, "") for id in (old.keys() - confirmed.keys()) | set(relabeled)
+    ]
+    changes.extend(
+        ("add", id, lbl)
+        for id, lbl in confirmed.items()
+        if id not in old or id in relabeled
+    )
+    feed.confirmed = confirmed
+
+    if changes:
+        for queue in feed.subscribers:
+            queue.put_nowait(changes)
+
+
+def _apply_poll(feed: Feed, confirmed: dict[str, str], started: float):
+    for rsvp, (value, at) in list(feed.pushed.items()):
+        if at <= started:
+            del feed.pushed[rsvp]
+        elif value:
+            confirmed[rsvp] = _label(feed.rsvps.get(rsvp))
+        else:
+            confirmed.pop(rsvp, None)
+    _apply(feed, confirmed)
+
+
+def _set(feed: Feed, rsvp: str, confirmed: bool):
+    if feed.confirmed is None:
+        return
+    feed.pushed[rsvp] = (confirmed, time.monotonic())
+    current = dict(feed.confirmed)
+    if confirmed:
+        current[rsvp] = _label(feed.rsvps.get(rsvp))
+    else:
+        current.pop(rsvp, None)
+    _apply(feed, current)
+
+
+async def _run(feed: Feed):
+    while feed.subscribers:
+        started = time.monotonic()
+        try:
+            confirmed = await asyncio.to_thread(_poll, feed)
+        except pltr.BackendUnavailable:
+            pass
+        else:
+            _apply_poll(feed, confirmed, started)
+        await asyncio.sleep(LIVE_POLL_INTERVAL)
+
+    feed.task = None
+    if feeds.get(feed.event) is feed:
+        del feeds[feed.event]
+
+
+def subscribe(event: str) -> tuple[Feed, asyncio.Queue[list[Change]]]:
+    feed = feeds.get(event)
+    if feed is None:
+        feed = feeds[event] = Feed(event, asyncio.get_running_loop())
+
+    queue: asyncio.Queue[list[Change]] = asyncio.Queue()
+    snapshot = feed.confirmed or {}
+    queue.put_nowait(
+        [("reset", "", ""), *(("add", id, lbl) for id, lbl in snapshot.items())]
+    )
+    feed.subscribers.add(queue)
+    if feed.task is None:
+        feed.task = asyncio.create_task(_run(feed))
+    return feed, queue
+
+
+def unsubscribe(feed: Feed, queue: asyncio.Queue[list[Change]]):
+    feed.subscribers.discard(queue)
+
+
+def rsvp_changed(rsvp: str, confirmed: bool):
+    for feed in list(feeds.values()):
+        if rsvp in feed.rsvps:
+            feed.loop.call_soon_threadsafe(_set, feed, rsvp, confirmed)
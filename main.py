@@ -2,13 +2,50 @@ from dataclasses import dataclass
 from datetime import datetime
 
 import humanize
-from fasthtml import Redirect, ft, serve
+from fasthtml import EventStream, Redirect, ft, serve
 from fasthtml import fastapp as fa
-
+from fasthtml.components import sse_message
+from fastcore.xml import to_xml
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.responses import HTMLResponse, StreamingResponse
+
+import admission
+import bulk
+import live
 import palantir as pltr
+import publish
 import templating as tmpl
 
-app, _ = fa.fast_app()
+
+def backend_err(req, exc):
+    return HTMLResponse(
+        to_xml(tmpl.generic_err()),
+        status_code=503,
+        headers={"Retry-After": str(int(pltr.BREAKER_COOLDOWN))},
+    )
+
+
+app, _ = fa.fast_app(
+    hdrs=(ft.Script(src="https://unpkg.com/htmx-ext-sse@2.2.2/sse.js"),),
+    exception_handlers={pltr.BackendUnavailable: backend_err},
+    middleware=[Middleware(admission.AdmissionMiddleware)],
+)
+
+
+def export_response(event: str | None, fmt: str) -> StreamingResponse:
+    export = bulk.prepare_export(event)
+    if fmt == "json":
+        body, media = bulk.export_json(export), "application/json"
+    else:
+        body, media, fmt = bulk.export_csv(export), "text/csv", "csv"
+
+    name = f"rsvps-{event}" if event else "rsvps"
+    return StreamingResponse(
+        body,
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
 
 
 @dataclass
@@ -78,6 +115,14 @@ def admin():
                             hx_get=event_rsvps.to(id=e.id),
                             hx_target="body",
                         ),
+                        " • ",
+                        ft.A("Export RSVPs", href=export_event.to(id=e.id)),
+                        " • ",
+                        ft.A(
+                            "Publish",
+                            hx_post=publish_event.to(id=e.id),
+                            hx_swap="outerHTML",
+                        ),
                     ),
                     name="event",
                 )
@@ -96,7 +141,13 @@ def admin():
             hx_target="body",
             style="margin-inline-end: 1rem;",
         ),
-        ft.Button("Recipients", hx_get=recipients.to(), hx_target="body"),
+        ft.Button(
+            "Recipients",
+            hx_get=recipients.to(),
+            hx_target="body",
+            style="margin-inline-end: 1rem;",
+        ),
+        ft.A(ft.Button("Export All", cls="secondary"), href=export_all.to()),
     )
 
 
@@ -146,6 +197,7 @@ def edit_event(data: EventForm, id: str):
         data.food,
         data.dress_code,
     )
+    publish.invalidate(id)
     return Redirect("/admin")
 
 
@@ -155,6 +207,7 @@ def delete_event(id: str):
     if letter is not None:
         pltr.delete_letter(letter)
         pltr.delete_event(id)
+        publish.invalidate(id)
 
     return Redirect("/admin")
 
@@ -219,10 +272,71 @@ def event_rsvps(id: str):
     return ft.Titled(
         f"{e.name if e else 'Your'} RSVPs",
         body,
+        ft.A(
+            ft.Button("Export", style="margin-inline-end: 1rem;"),
+            href=export_event.to(id=id),
+        ),
+        ft.Button(
+            "Live",
+            hx_get=event_live.to(id=id),
+            hx_target="body",
+            style="margin-inline-end: 1rem;",
+        ),
         ft.Button("Back", cls="secondary outline", hx_get=admin.to(), hx_target="body"),
     )
 
 
+@app.get("/event/live")
+def event_live(id: str):
+    e = pltr.event_by_id(id)
+    return ft.Titled(
+        f"{e.name if e else 'Your'} RSVPs (Live)",
+        ft.Div(
+            ft.Ul(id="live-rsvps"),
+            hx_ext="sse",
+            sse_connect=live_stream.to(id=id),
+            sse_swap="message",
+            hx_swap="none",
+        ),
+        ft.Button(
+            "Back",
+            cls="secondary outline",
+            hx_get=event_rsvps.to(id=id),
+            hx_target="body",
+        ),
+    )
+
+
+async def live_updates(event: str):
+    feed, queue = live.subscribe(event)
+    try:
+        while True:
+            yield sse_message(tmpl.live_update(await queue.get()))
+    finally:
+        live.unsubscribe(feed, queue)
+
+
+@app.get("/event/live/stream")
+async def live_stream(id: str):
+    return EventStream(live_updates(id))
+
+
+@app.get("/event/export")
+def export_event(id: str, fmt: str = "csv"):
+    return export_response(id, fmt)
+
+
+@app.get("/export")
+def export_all(fmt: str = "csv"):
+    return export_response(None, fmt)
+
+
+@app.post("/event/publish")
+def publish_event(id: str):
+    rebuilt, total = publish.publish(id)
+    return ft.Span(f"Published ({rebuilt} of {total} pages rebuilt)")
+
+
 @app.get("/letter")
 def letter_editor(id: str):
     letter = pltr.letter_by_id(id)
@@ -241,7 +355,10 @@ def letter_editor(id: str):
 
 @app.post("/letter")
 def edit_letter(id: str, content: str):
+    letter = pltr.letter_by_id(id)
     pltr.edit_letter(id, content)
+    if letter is not None:
+        publish.invalidate(letter.event_id)
     return Redirect("/admin")
 
 
@@ -274,10 +391,35 @@ def recipients():
             hx_target="body",
             style="margin-inline-end: 1rem;",
         ),
+        ft.Button(
+            "Import",
+            hx_get=recipient_importer.to(),
+            hx_target="body",
+            style="margin-inline-end: 1rem;",
+        ),
         ft.Button("Back", cls="secondary outline", hx_get=admin.to(), hx_target="body"),
     )
 
 
+@app.get("/recipients/import")
+def recipient_importer():
+    return tmpl.recipient_import()
+
+
+@app.post("/recipients/import")
+def import_recipients(file: UploadFile):
+    job = bulk.start_import(file.file, file.filename or "")
+    return ft.Titled("Importing Recipients", tmpl.import_status(job))
+
+
+@app.get("/recipients/import/progress")
+def import_progress(id: str):
+    job = bulk.import_jobs.get(id)
+    if job is None:
+        return tmpl.generic_err()
+    return tmpl.import_status(job)
+
+
 @app.get("/recipient/create")
 def recipient_creator():
     return tmpl.recipient()
@@ -300,12 +442,14 @@ def recipient_editor(id: str):
 @app.post("/recipient/edit")
 def edit_recipient(id: str, name: str, hnr: str):
     pltr.edit_recipient(id, name, hnr)
+    publish.invalidate_recipient(id)
     return Redirect("/recipients")
 
 
 @app.delete("/recipient")
 def delete_recipient(id: str):
     pltr.delete_recipient(id)
+    publish.invalidate_recipient(id)
     return Redirect("/recipients")
 
 
@@ -334,21 +478,36 @@ def delete_rsvp(id: str):
 @app.post("/confirm")
 def confirm(id: str, val: bool):
     pltr.update_rsvp_status(id, val)
+    live.rsvp_changed(id, val)
     return tmpl.rsvp_button(id, val)
 
 
+@app.get("/admission")
+def admission_metrics():
+    return admission.metrics()
+
+
 @app.get("/view/{id}")
 def bespoke_view(id: str):
     rsvp = pltr.rsvp(id)
     if rsvp is None:
         return tmpl.permission_err()
 
+    is_rsvpd = rsvp.confirmed if rsvp.confirmed else False
+    page = publish.page(rsvp.event_id, id)
+    if page is not None:
+        return ft.Title(page.title), ft.Main(
+            page.article(),
+            tmpl.rsvp_button(id, is_rsvpd),
+            cls="container",
+        )
+
     event = pltr.event_by_id(rsvp.event_id)
     recipient = pltr.recipient(rsvp.recipient_id)
     if event is None or recipient is None:
         return tmpl.generic_err()
 
-    letter = event.letter()
+    letter = pltr.event_letter(event)
     if letter is None:
         return tmpl.generic_err()
 
@@ -356,16 +515,8 @@ def bespoke_view(id: str):
         event.when if event.when else datetime.today()
     ).capitalize()
 
-    is_rsvpd = rsvp.confirmed if rsvp.confirmed else False
     return ft.Title(event.name), ft.Main(
-        ft.Article(
-            ft.P(f"Dear {recipient.honorific} {recipient.name},"),
-            ft.P(
-                f"You are cordially invited to {event.name} on {timing} at {event.location}."
-            ),
-            ft.P(letter.content, style="white-space: pre-wrap;"),
-            style="max-width: 25rem; margin-inline: auto;",
-        ),
+        tmpl.invitation(event, recipient, letter.content, timing),
         tmpl.rsvp_button(id, is_rsvpd),
         cls="container",
     )
@@ -1,31 +1,254 @@
+import itertools
 import os
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
 
+import requests
 from cordially_sdk import FoundryClient, UserTokenAuth
 from cordially_sdk.ontology.objects import Event, Letter, Recipient, Rsvp
-
+from foundry_sdk import Config
+
+READ_DEADLINE = float(os.environ.get("FOUNDRY_READ_DEADLINE", "2.0"))
+WRITE_DEADLINE = float(os.environ.get("FOUNDRY_WRITE_DEADLINE", "5.0"))
+DEADLINES: dict[str, float] = {
+    "events": 5.0,
+    "recipients": 5.0,
+    "rsvps_for": 5.0,
+    "create_recipients": 30.0,
+    "rsvp_page": 10.0,
+}
+RSVP_PAGE_SIZE = 1000
+POOL_SIZE = 32
+HEDGE_PERCENTILE = float(os.environ.get("FOUNDRY_HEDGE_PERCENTILE", "0.95"))
+HEDGE_BUDGET = float(os.environ.get("FOUNDRY_HEDGE_BUDGET", "0.1"))
+READ_RETRIES = int(os.environ.get("FOUNDRY_READ_RETRIES", "2"))
+RETRY_BACKOFF = 0.05
+STALE_ENTRIES = int(os.environ.get("FOUNDRY_STALE_ENTRIES", "1024"))
+BREAKER_THRESHOLD = int(os.environ.get("FOUNDRY_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("FOUNDRY_BREAKER_COOLDOWN", "30.0"))
+
+# Deadlines only stop callers waiting; the transport timeout is what ends an
+# abandoned call and frees its pool worker.
 auth = UserTokenAuth(token=os.environ["FOUNDRY_TOKEN"])
-client = FoundryClient(auth=auth, hostname="https://figbert.usw-18.palantirfoundry.com")
+client = FoundryClient(
+    auth=auth,
+    hostname="https://figbert.usw-18.palantirfoundry.com",
+    config=Config(timeout=max(READ_DEADLINE, WRITE_DEADLINE, *DEADLINES.values())),
+)
+
+
+class BackendUnavailable(Exception):
+    pass
+
+
+_pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="foundry")
+_latencies: defaultdict[str, deque[float]] = defaultdict(lambda: deque(maxlen=200))
+_stale: OrderedDict[tuple, object] = OrderedDict()
+_stale_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_inflight = 0
+_reads = 0
+_hedges = 0
+_breaker_lock = threading.Lock()
+_failures = 0
+_open_until = 0.0
+
+
+def _transient(e: BaseException) -> bool:
+    if isinstance(
+        e, (TimeoutError, ConnectionError, requests.ConnectionError, requests.Timeout)
+    ):
+        return True
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+def _breaker_open() -> bool:
+    with _breaker_lock:
+        return _failures >= BREAKER_THRESHOLD and time.monotonic() < _open_until
+
+
+def _record_success():
+    global _failures
+    with _breaker_lock:
+        _failures = 0
+
+
+def _record_failure():
+    global _failures, _open_until
+    with _breaker_lock:
+        _failures += 1
+        if _failures >= BREAKER_THRESHOLD:
+            _open_until = time.monotonic() + BREAKER_COOLDOWN
+
+
+def _remember(key: tuple, value: object):
+    with _stale_lock:
+        _stale[key] = value
+        _stale.move_to_end(key)
+        while len(_stale) > STALE_ENTRIES:
+            _stale.popitem(last=False)
+
+
+def _stale_or_raise(key: tuple, stale: bool):
+    with _stale_lock:
+        if stale and key in _stale:
+            _stale.move_to_end(key)
+            return _stale[key]
+    raise BackendUnavailable(key[0])
+
+
+def _timed[T](op: str, fn: Callable[[], T]) -> T:
+    # Measured from when a worker picks the call up, so pool queueing does not
+    # inflate the hedge delay.
+    global _inflight
+    with _stats_lock:
+        _inflight += 1
+    start = time.monotonic()
+    try:
+        result = fn()
+    finally:
+        with _stats_lock:
+            _inflight -= 1
+    _latencies[op].append(time.monotonic() - start)
+    return result
+
+
+def _hedge_delay(op: str, deadline: float) -> float:
+    samples = sorted(_latencies[op])
+    if len(samples) < 20:
+        return deadline / 2
+    return samples[min(int(len(samples) * HEDGE_PERCENTILE), len(samples) - 1)]
+
+
+def _may_hedge() -> bool:
+    global _hedges
+    with _breaker_lock:
+        if _failures:
+            return False
+    with _stats_lock:
+        if _inflight >= POOL_SIZE // 2 or _hedges >= HEDGE_BUDGET * _reads:
+            return False
+        _hedges += 1
+        return True
+
+
+def _hedged[T](op: str, fn: Callable[[], T], timeout: float) -> T:
+    global _reads, _hedges
+    with _stats_lock:
+        _reads += 1
+        if _reads >= 1000:
+            _reads, _hedges = _reads // 2, _hedges // 2
+
+    start = time.monotonic()
+    futures: list[Future[T]] = [_pool.submit(_timed, op, fn)]
+    done, _ = wait(futures, timeout=min(_hedge_delay(op, timeout), timeout))
+    if not done:
+        if _may_hedge():
+            futures.append(_pool.submit(_timed, op, fn))
+        remaining = timeout - (time.monotonic() - start)
+        done, _ = wait(futures, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+
+    for future in futures:
+        if future not in done:
+            future.cancel()
+    if not done:
+        raise TimeoutError(op)
+    return done.pop().result()
+
+
+def _read[T](key: tuple, fn: Callable[[], T], stale: bool = False) -> T:
+    if _breaker_open():
+        return _stale_or_raise(key, stale)
+
+    op = key[0]
+    deadline = time.monotonic() + DEADLINES.get(op, READ_DEADLINE)
+    for attempt in range(READ_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            result = _hedged(op, fn, remaining)
+        except Exception as e:
+            if not _transient(e):
+                raise
+            time.sleep(
+                min(RETRY_BACKOFF * 2**attempt * random.random(), max(remaining, 0))
+            )
+            continue
+
+        _record_success()
+        if stale and result is not None:
+            _remember(key, result)
+        return result
+
+    _record_failure()
+    return _stale_or_raise(key, stale)
+
+
+def _once[T](op: str, fn: Callable[[], T]) -> T:
+    if _breaker_open():
+        raise BackendUnavailable(op)
+
+    future = _pool.submit(fn)
+    try:
+        result = future.result(timeout=DEADLINES.get(op, WRITE_DEADLINE))
+    except Exception as e:
+        if not _transient(e):
+            raise
+        future.cancel()
+        _record_failure()
+        raise BackendUnavailable(op) from e
+    _record_success()
+    return result
+
+
+def _write(op: str, fn: Callable[[], object]):
+    _once(op, fn)
 
 
 def get_user() -> str:
-    resp = client.foundry_sdk.admin.User.get_current().given_name
+    resp = _read(
+        ("get_user",),
+        lambda: client.foundry_sdk.admin.User.get_current().given_name,
+        stale=True,
+    )
     return resp if resp else "User"
 
 
 def events() -> list[Event]:
-    return list(
-        client.ontology.objects.Event.order_by(Event.object_type.when.asc()).iterate()
+    return _read(
+        ("events",),
+        lambda: list(
+            client.ontology.objects.Event.order_by(
+                Event.object_type.when.asc()
+            ).iterate()
+        ),
+        stale=True,
     )
 
 
 def event_by_id(id: str | None) -> Event | None:
-    return client.ontology.objects.Event.get(id)
+    return _read(
+        ("event", id), lambda: client.ontology.objects.Event.get(id), stale=True
+    )
 
 
 def event_by_name(name: str) -> Event:
-    return list(
-        client.ontology.objects.Event.where(Event.object_type.name == name).iterate()
+    return _read(
+        ("event_by_name", name),
+        lambda: list(
+            client.ontology.objects.Event.where(
+                Event.object_type.name == name
+            ).iterate()
+        ),
     )[0]
 
 
@@ -37,14 +260,17 @@ def create_event(
     food: str,
     dress_code: str,
 ):
-    _ = client.ontology.actions.create_event(
-        name=name,
-        location=location,
-        accepting_invites=True,
-        when=when,
-        end=end,
-        food=food,
-        dress_code=dress_code,
+    _write(
+        "create_event",
+        lambda: client.ontology.actions.create_event(
+            name=name,
+            location=location,
+            accepting_invites=True,
+            when=when,
+            end=end,
+            food=food,
+            dress_code=dress_code,
+        ),
     )
 
 
@@ -57,76 +283,147 @@ def edit_event(
     food: str,
     dress_code: str,
 ):
-    _ = client.ontology.actions.edit_event(
-        event=id,
-        name=name,
-        location=location,
-        accepting_invites=True,
-        when=when,
-        end=end,
-        food=food,
-        dress_code=dress_code,
+    _write(
+        "edit_event",
+        lambda: client.ontology.actions.edit_event(
+            event=id,
+            name=name,
+            location=location,
+            accepting_invites=True,
+            when=when,
+            end=end,
+            food=food,
+            dress_code=dress_code,
+        ),
     )
 
 
 def delete_event(id: str):
-    _ = client.ontology.actions.delete_event(event=id)
+    _write("delete_event", lambda: client.ontology.actions.delete_event(event=id))
 
 
 def letter_by_id(id: str) -> Letter | None:
-    return client.ontology.objects.Letter.get(id)
+    return _read(("letter", id), lambda: client.ontology.objects.Letter.get(id))
 
 
 def letter_by_event(id: str | None) -> Letter:
-    return list(
-        client.ontology.objects.Letter.where(
-            Letter.object_type.event_id == id
-        ).iterate()
+    return _read(
+        ("letter_by_event", id),
+        lambda: list(
+            client.ontology.objects.Letter.where(
+                Letter.object_type.event_id == id
+            ).iterate()
+        ),
+        stale=True,
     )[0]
 
 
+def event_letter(evt: Event) -> Letter | None:
+    return _read(("event_letter", evt.id), evt.letter, stale=True)
+
+
 def create_letter(event: str):
-    _ = client.ontology.actions.create_letter(event_id=event, content="")
+    _write(
+        "create_letter",
+        lambda: client.ontology.actions.create_letter(event_id=event, content=""),
+    )
 
 
 def edit_letter(id: str, content: str):
-    _ = client.ontology.actions.edit_letter(letter=id, content=content)
+    _write(
+        "edit_letter",
+        lambda: client.ontology.actions.edit_letter(letter=id, content=content),
+    )
 
 
 def delete_letter(id: str):
-    _ = client.ontology.actions.delete_letter(letter=id)
+    _write("delete_letter", lambda: client.ontology.actions.delete_letter(letter=id))
 
 
 def recipients() -> list[Recipient]:
-    return list(client.ontology.objects.Recipient.iterate())
+    return _read(
+        ("recipients",),
+        lambda: list(client.ontology.objects.Recipient.iterate()),
+        stale=True,
+    )
+
+
+def recipient_index() -> dict[str, Recipient]:
+    return {r.id: r for r in recipients() if r.id is not None}
 
 
 def recipient(id: str | None) -> Recipient | None:
-    return client.ontology.objects.Recipient.get(id)
+    return _read(
+        ("recipient", id),
+        lambda: client.ontology.objects.Recipient.get(id),
+        stale=True,
+    )
 
 
 def create_recipient(name: str, hnr: str):
-    _ = client.ontology.actions.create_recipient(name=name, honorific=hnr)
+    _write(
+        "create_recipient",
+        lambda: client.ontology.actions.create_recipient(name=name, honorific=hnr),
+    )
+
+
+def create_recipients(rcps: list[tuple[str, str]]):
+    _write(
+        "create_recipients",
+        lambda: client.ontology.batch_actions.create_recipient(
+            requests=[{"name": name, "honorific": hnr} for hnr, name in rcps]
+        ),
+    )
 
 
 def edit_recipient(id: str, name: str, hnr: str):
-    _ = client.ontology.actions.edit_recipient(recipient=id, name=name, honorific=hnr)
+    _write(
+        "edit_recipient",
+        lambda: client.ontology.actions.edit_recipient(
+            recipient=id, name=name, honorific=hnr
+        ),
+    )
 
 
 def delete_recipient(id: str):
-    _ = client.ontology.actions.delete_recipient(recipient=id)
+    _write(
+        "delete_recipient",
+        lambda: client.ontology.actions.delete_recipient(recipient=id),
+    )
 
 
 def rsvp(id: str) -> Rsvp | None:
-    return client.ontology.objects.Rsvp.get(id)
+    return _read(
+        ("rsvp", id), lambda: client.ontology.objects.Rsvp.get(id), stale=True
+    )
 
 
-def rsvps_for(event: str) -> list[Rsvp]:
-    return list(
-        client.ontology.objects.Rsvp.where(Rsvp.object_type.event_id == event).iterate()
+def rsvps_for(event: str, stale: bool = True) -> list[Rsvp]:
+    return _read(
+        ("rsvps_for", event),
+        lambda: list(
+            client.ontology.objects.Rsvp.where(
+                Rsvp.object_type.event_id == event
+            ).iterate()
+        ),
+        stale=stale,
     )
 
 
+def iter_rsvps(event: str | None = None) -> Iterator[Rsvp]:
+    query = client.ontology.objects.Rsvp
+    if event is not None:
+        query = query.where(Rsvp.object_type.event_id == event)
+
+    # Pages can't be retried or hedged without re-reading the iterator, so
+    # each one only gets a deadline.
+    rsvps = query.iterate()
+    while page := _once(
+        "rsvp_page", lambda: list(itertools.islice(rsvps, RSVP_PAGE_SIZE))
+    ):
+        yield from page
+
+
 def rsvp_between(rcp: str | None, evt: str) -> Rsvp | None:
     rsvps = rsvps_for(evt)
     for rsvp in rsvps:
@@ -136,14 +433,20 @@ def rsvp_between(rcp: str | None, evt: str) -> Rsvp | None:
 
 
 def create_rsvp(event: str, rcp: str):
-    _ = client.ontology.actions.create_rsvp(
-        event_id=event, recipient_id=rcp, confirmed=False
+    _write(
+        "create_rsvp",
+        lambda: client.ontology.actions.create_rsvp(
+            event_id=event, recipient_id=rcp, confirmed=False
+        ),
     )
 
 
 def delete_rsvp(id: str):
-    _ = client.ontology.actions.delete_rsvp(rsvp=id)
+    _write("delete_rsvp", lambda: client.ontology.actions.delete_rsvp(rsvp=id))
 
 
 def update_rsvp_status(id: str, status: bool):
-    _ = client.ontology.actions.edit_rsvp(rsvp=id, confirmed=status)
+    _write(
+        "update_rsvp_status",
+        lambda: client.ontology.actions.edit_rsvp(rsvp=id, confirmed=status),
+    )
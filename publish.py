@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+import humanize
+from cordially_sdk.ontology.objects import Event, Recipient
+from fastcore.xml import NotStr, to_xml
+
+import palantir as pltr
+import templating as tmpl
+
+PUBLISH_DIR = Path(os.environ.get("PUBLISH_DIR", "published"))
+PUBLISH_WORKERS = int(os.environ.get("PUBLISH_WORKERS", "8"))
+PUBLISH_ATTEMPTS = 3
+
+# Relative dates go stale, so pages are stored with a marker that is filled
+# in at serve time.
+TIMING = "\ue000timing\ue000"
+
+
+@dataclass
+class Page:
+    title: str
+    when: str | None
+    html: str
+
+    def article(self) -> NotStr:
+        when = datetime.fromisoformat(self.when) if self.when else datetime.today()
+        timing = humanize.naturaldate(when).capitalize()
+        return NotStr(self.html.replace(TIMING, timing))
+
+
+_lock = threading.Lock()
+_generation = 0
+
+
+def _write_json(path: Path, data: object):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data))
+    tmp.replace(path)
+
+
+def _digest(evt: Event, content: str, rcp: Recipient) -> str:
+    inputs = [evt.name, evt.location, evt.when, content, rcp.honorific, rcp.name]
+    return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()
+
+
+def _render(dir: Path, evt: Event, content: str, rsvp: str, rcp: Recipient):
+    page = Page(
+        title=evt.name or "",
+        when=evt.when.isoformat() if evt.when else None,
+        html=to_xml(tmpl.invitation(evt, rcp, content, TIMING)),
+    )
+    _write_json(dir / f"{rsvp}.json", asdict(page))
+
+
+def _build(event: str, generation: int) -> tuple[int, int] | None:
+    evt = pltr.event_by_id(event)
+    letter = pltr.event_letter(evt) if evt else None
+    if evt is None or letter is None:
+        return 0, 0
+
+    content = letter.content or ""
+    people = pltr.recipient_index()
+    rsvps = pltr.rsvps_for(event)
+
+    dir = PUBLISH_DIR / event
+    build = PUBLISH_DIR / f".build-{event}-{uuid.uuid4().hex}"
+    build.mkdir(parents=True)
+    try:
+        try:
+            old = json.loads((dir / "manifest.json").read_text())
+        except FileNotFoundError:
+            old = {}
+
+        new: dict[str, list[str]] = {}
+        todo = []
+        for rsvp in rsvps:
+            rcp = people.get(rsvp.recipient_id or "")
+            if rcp is None or rsvp.primary_key_ is None or rsvp.recipient_id is None:
+                continue
+            entry = [_digest(evt, content, rcp), rsvp.recipient_id]
+            new[rsvp.primary_key_] = entry
+            if old.get(rsvp.primary_key_) == entry:
+                name = f"{rsvp.primary_key_}.json"
+                try:
+                    os.link(dir / name, build / name)
+                    continue
+                except OSError:
+                    pass
+            todo.append((rsvp.primary_key_, rcp))
+
+        with ThreadPoolExecutor(max_workers=PUBLISH_WORKERS) as pool:
+            list(pool.map(lambda job: _render(build, evt, content, *job), todo))
+        _write_json(build / "manifest.json", new)
+
+        trash = PUBLISH_DIR / f".trash-{event}-{uuid.uuid4().hex}"
+        with _lock:
+            if _generation != generation:
+                return None
+            if dir.exists():
+                dir.rename(trash)
+            build.rename(dir)
+        shutil.rmtree(trash, ignore_errors=True)
+        return len(todo), len(new)
+    finally:
+        shutil.rmtree(build, ignore_errors=True)
+
+
+def publish(event: str) -> tuple[int, int]:
+    if _event_dir(event) is None:
+        return 0, 0
+
+    # Pages are built aside and swapped in only if nothing was invalidated
+    # since the data load; otherwise the build is discarded and redone.
+    for _ in range(PUBLISH_ATTEMPTS):
+        with _lock:
+            generation = _generation
+        result = _build(event, generation)
+        if result is not None:
+            return result
+    return 0, 0
+
+
+def _event_dir(event: str | None) -> Path | None:
+    if not event or event.startswith(".") or Path(event).name != event:
+        return None
+    return PUBLISH_DIR / event
+
+
+def invalidate(event: str | None):
+    global _generation
+    dir = _event_dir(event)
+    with _lock:
+        _generation += 1
+        if dir is not None:
+            shutil.rmtree(dir, ignore_errors=True)
+
+
+def invalidate_recipient(rcp: str):
+    global _generation
+    with _lock:
+        _generation += 1
+        for manifest_path in PUBLISH_DIR.glob("[!.]*/manifest.json"):
+            manifest = json.loads(manifest_path.read_text())
+            stale = [rsvp for rsvp, (_, owner) in manifest.items() if owner == rcp]
+            if not stale:
+                continue
+            for rsvp in stale:
+                (manifest_path.parent / f"{rsvp}.json").unlink(missing_ok=True)
+                del manifest[rsvp]
+            _write_json(manifest_path, manifest)
+
+
+def page(event: str | None, rsvp: str) -> Page | None:
+    dir = _event_dir(event)
+    if dir is None:
+        return None
+    try:
+        return Page(**json.loads((dir / f"{rsvp}.json").read_text()))
+    except FileNotFoundError:
+        return None
@@ -1,6 +1,12 @@
+from typing import TYPE_CHECKING
+
 from cordially_sdk.ontology.objects import Event, Recipient
 from fasthtml import ft
 
+if TYPE_CHECKING:
+    from bulk import ImportJob
+    from live import Change
+
 DELETE_STYLE = "background-color: #d93526; border-color: #d93526;"
 
 
@@ -209,6 +215,64 @@ def recipient(rcp: Recipient | None = None) -> ft.FT:
     )
 
 
+def recipient_import() -> ft.FT:
+    return ft.Titled(
+        "Import Recipients",
+        ft.P(
+            "Upload a CSV or TSV file whose first row is a header with a name "
+            "column and, optionally, an honorific column."
+        ),
+        ft.Form(
+            ft.Input(
+                type="file",
+                name="file",
+                accept=".csv,.tsv,text/csv,text/tab-separated-values",
+                required=True,
+            ),
+            ft.Button(
+                "Import",
+                style="margin-inline-end: 1rem;",
+                hx_post="/recipients/import",
+                hx_encoding="multipart/form-data",
+                hx_target="body",
+            ),
+            ft.Button(
+                "Back",
+                cls="secondary outline",
+                hx_get="/recipients",
+                hx_target="body",
+            ),
+        ),
+    )
+
+
+def import_status(job: "ImportJob") -> ft.FT:
+    stats = ft.P(
+        f"{job.read} rows read, {job.created} created, {job.skipped} duplicates, "
+        f"{job.invalid} invalid, {job.failed} failed"
+    )
+    if not job.done:
+        return ft.Div(
+            ft.Progress(),
+            stats,
+            hx_get=f"/recipients/import/progress?id={job.id}",
+            hx_trigger="every 1s",
+            hx_swap="outerHTML",
+        )
+
+    return ft.Div(
+        ft.P(
+            f"Import finished with errors: {job.error}"
+            if job.error
+            else "Import complete."
+        ),
+        stats,
+        ft.Button(
+            "Back", cls="secondary outline", hx_get="/recipients", hx_target="body"
+        ),
+    )
+
+
 def add_recipient_button(event: str | None, rcp: str | None) -> ft.FT:
     return ft.Button(
         "+",
@@ -262,6 +326,32 @@ def recipient_link(rsvp: str) -> ft.FT:
     )
 
 
+def invitation(evt: Event, rcp: Recipient, content: str, timing: str) -> ft.FT:
+    return ft.Article(
+        ft.P(f"Dear {rcp.honorific} {rcp.name},"),
+        ft.P(f"You are cordially invited to {evt.name} on {timing} at {evt.location}."),
+        ft.P(content, style="white-space: pre-wrap;"),
+        style="max-width: 25rem; margin-inline: auto;",
+    )
+
+
+def live_update(changes: "list[Change]") -> ft.FT:
+    elems = []
+    for kind, rsvp, label in changes:
+        if kind == "reset":
+            elems.append(ft.Ul(id="live-rsvps", hx_swap_oob="true"))
+        elif kind == "add":
+            elems.append(
+                ft.Div(
+                    ft.Li(label, id=f"live-{rsvp}"),
+                    hx_swap_oob="beforeend:#live-rsvps",
+                )
+            )
+        else:
+            elems.append(ft.Li(id=f"live-{rsvp}", hx_swap_oob="delete"))
+    return ft.Div(*elems)
+
+
 def rsvp_button(id: str, cancel: bool = False) -> ft.FT:
     return ft.Button(
         f"{'Cancel' if cancel else 'RSVP'}",